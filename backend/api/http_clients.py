@@ -0,0 +1,47 @@
+"""
+============================================================================
+HTTP CLIENTS - Shared keep-alive pools for InfluxDB and Groq
+============================================================================
+One client per upstream, reused across requests instead of opening a new
+connection (and TLS handshake) per call. Created lazily, after the HTTPX
+instrumentation is set up, and closed on API shutdown.
+============================================================================
+"""
+
+from typing import Optional
+
+import httpx
+
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=40, max_connections=100, keepalive_expiry=30.0)
+
+# Groq calls may take a while to generate, but an unreachable host fails fast
+GROQ_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+_influx_client: Optional[httpx.AsyncClient] = None
+_groq_client: Optional[httpx.AsyncClient] = None
+
+
+def get_influx_client() -> httpx.AsyncClient:
+    """Return the shared InfluxDB client, creating it on first use."""
+    global _influx_client
+    if _influx_client is None or _influx_client.is_closed:
+        _influx_client = httpx.AsyncClient(timeout=10.0, limits=HTTP_LIMITS)
+    return _influx_client
+
+
+def get_groq_client() -> httpx.AsyncClient:
+    """Return the shared Groq client, creating it on first use."""
+    global _groq_client
+    if _groq_client is None or _groq_client.is_closed:
+        _groq_client = httpx.AsyncClient(timeout=GROQ_TIMEOUT, limits=HTTP_LIMITS)
+    return _groq_client
+
+
+async def close_http_clients():
+    """Close the shared HTTP clients (called on API shutdown)."""
+    global _influx_client, _groq_client
+    for client in (_influx_client, _groq_client):
+        if client is not None and not client.is_closed:
+            await client.aclose()
+    _influx_client = None
+    _groq_client = None
@@ -0,0 +1,54 @@
+"""
+============================================================================
+LLM CACHE - Recent Groq analyses keyed by their prompt
+============================================================================
+In-process LRU with TTL: identical metric windows (repeated downloads of the
+same report) reuse the analysis instead of another Groq round-trip.
+
+Cache policies (the cache_policy argument of generate_llm_analysis):
+- enabled:  read and write the cache (default)
+- disabled: always call the LLM and never store the result
+- replay:   serve cached analyses only, never call the LLM (tests, demos)
+============================================================================
+"""
+
+import asyncio
+import copy
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import orjson
+
+LLM_CACHE_TTL = 3600
+LLM_CACHE_SIZE = 64
+
+CACHE_POLICIES = ("enabled", "disabled", "replay")
+
+_llm_cache: "OrderedDict[bytes, tuple]" = OrderedDict()
+_llm_cache_lock = asyncio.Lock()
+
+
+def llm_cache_key(*prompt_parts: str) -> bytes:
+    """Fingerprint of everything that is sent to the model."""
+    return hashlib.blake2b(orjson.dumps(prompt_parts), digest_size=16).digest()
+
+
+async def llm_cache_get(key: bytes) -> Optional[Dict[str, Any]]:
+    """Return a copy of a cached analysis that is still fresh, or None."""
+    async with _llm_cache_lock:
+        cached = _llm_cache.get(key)
+        if cached is None or time.monotonic() - cached[0] >= LLM_CACHE_TTL:
+            return None
+        _llm_cache.move_to_end(key)
+        return copy.deepcopy(cached[1])
+
+
+async def llm_cache_put(key: bytes, analysis: Dict[str, Any]) -> None:
+    """Store a copy of an LLM analysis, evicting the least recently used."""
+    async with _llm_cache_lock:
+        _llm_cache[key] = (time.monotonic(), copy.deepcopy(analysis))
+        _llm_cache.move_to_end(key)
+        while len(_llm_cache) > LLM_CACHE_SIZE:
+            _llm_cache.popitem(last=False)
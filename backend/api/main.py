@@ -36,6 +36,7 @@ from .auth_routes import router as auth_router
 from .training_routes import router as training_router
 from .gamification_routes import router as gamification_router
 from .rag_routes import router as rag_router
+from .http_clients import close_http_clients
 
 logging.basicConfig(
     level=logging.INFO,
@@ -88,6 +89,7 @@ async def lifespan(app: FastAPI):
     yield
 
     # Shutdown
+    await close_http_clients()
     logger.info("API detenida")
 
 
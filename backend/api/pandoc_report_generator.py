@@ -9,12 +9,14 @@ with colored boxes, professional typography, and modern design.
 
 import io
 import os
+import asyncio
 import base64
+import shutil
 import tempfile
 import subprocess
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, AsyncIterator
 import math
 
 import matplotlib
@@ -24,6 +26,15 @@ import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Size of the chunks read from Pandoc's stdout when streaming a PDF
+PDF_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Seconds a single Pandoc run may take, from launch to exit
+PANDOC_TIMEOUT = 120
+
+# Pandoc + pdflatex runs allowed at once; further requests wait for a slot
+PANDOC_MAX_CONCURRENCY = int(os.getenv("PANDOC_MAX_CONCURRENCY", min(4, os.cpu_count() or 1)))
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
@@ -300,6 +311,9 @@ class PandocReportGenerator:
     
     def __init__(self):
         self.template_path = os.path.join(os.path.dirname(__file__), 'templates', 'eisvogel.latex')
+        # Resolved once so each run skips the PATH lookup
+        self.pandoc_bin = shutil.which('pandoc') or 'pandoc'
+        self._pandoc_slots = asyncio.Semaphore(PANDOC_MAX_CONCURRENCY)
     
     def _get_status_icon(self, value: float, thresholds: tuple, inverse: bool = False) -> str:
         """Return status indicator based on thresholds (ASCII for LaTeX compatibility)."""
@@ -640,6 +654,35 @@ identificando las horas y días de mayor demanda:
         
         return frontmatter + content
     
+    def _pandoc_commands(self, input_path: str, output_path: str) -> List[List[str]]:
+        """
+        Pandoc commands to try in order: Eisvogel template, then a minimal fallback.
+        
+        The output format is explicit: with '-o -' there is no .pdf extension to
+        infer it from, and Pandoc would write HTML to stdout.
+        """
+        return [
+            [
+                self.pandoc_bin,
+                input_path,
+                '-o', output_path,
+                '-t', 'pdf',
+                '--pdf-engine=pdflatex',
+                '--template', self.template_path,
+                '--standalone',
+                '--listings',
+            ],
+            [
+                self.pandoc_bin,
+                input_path,
+                '-o', output_path,
+                '-t', 'pdf',
+                '--pdf-engine=pdflatex',
+                '-V', 'geometry:margin=2.5cm',
+                '--standalone',
+            ],
+        ]
+    
     def generate_pdf(self, metrics: Dict, period_type: str,
                      start_date: datetime, end_date: datetime,
                      llm_analysis: Optional[Dict] = None) -> io.BytesIO:
@@ -658,37 +701,17 @@ identificando las horas y días de mayor demanda:
         pdf_path = md_path.replace('.md', '.pdf')
         
         try:
-            # Path to template
-            template_path = os.path.join(os.path.dirname(__file__), 'templates', 'eisvogel.latex')
-            
-            # Build Pandoc command
-            cmd = [
-                'pandoc',
-                md_path,
-                '-o', pdf_path,
-                '--pdf-engine=pdflatex',
-                '--template', template_path,
-                '--standalone',
-                '--listings',
-            ]
+            cmd, cmd_simple = self._pandoc_commands(md_path, pdf_path)
             
             # Run Pandoc
             logger.info(f"Running Pandoc with {len(cmd)} arguments")
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=PANDOC_TIMEOUT)
             
             if result.returncode != 0:
                 logger.error(f"Pandoc error: {result.stderr}")
                 # Try even simpler command without cover
-                cmd_simple = [
-                    'pandoc',
-                    md_path,
-                    '-o', pdf_path,
-                    '--pdf-engine=pdflatex',
-                    '-V', 'geometry:margin=2.5cm',
-                    '--standalone',
-                ]
                 logger.info("Retrying with minimal Pandoc command")
-                result = subprocess.run(cmd_simple, capture_output=True, text=True, timeout=120)
+                result = subprocess.run(cmd_simple, capture_output=True, text=True, timeout=PANDOC_TIMEOUT)
                 
                 if result.returncode != 0:
                     raise Exception(f"Pandoc failed: {result.stderr}")
@@ -710,7 +733,81 @@ identificando las horas y días de mayor demanda:
                     os.unlink(pdf_path)
             except:
                 pass
-
+    
+    async def stream_pdf(self, markdown_content: str) -> AsyncIterator[bytes]:
+        """
+        Convert markdown from generate_markdown() to PDF with Pandoc and yield
+        it in chunks as Pandoc writes it.
+        
+        Markdown goes in on stdin and the PDF comes out on stdout, so no temp
+        files are used and the event loop is never blocked. Pandoc only writes
+        output once LaTeX succeeds, so an empty stdout means the attempt failed
+        and the minimal command is tried before anything is yielded. The last
+        chunk is only yielded once Pandoc exits cleanly, so a failure after
+        partial output raises instead of ending a truncated PDF.
+        generate_markdown() draws charts with matplotlib, so callers should run
+        it in a worker thread rather than on the event loop.
+        """
+        markdown_bytes = markdown_content.encode('utf-8')
+        loop = asyncio.get_running_loop()
+        
+        stderr = b""
+        # Bounded pool of Pandoc slots; the slot is held across the fallback attempt
+        async with self._pandoc_slots:
+            for attempt, cmd in enumerate(self._pandoc_commands('-', '-')):
+                if attempt:
+                    logger.info("Retrying with minimal Pandoc command")
+                else:
+                    logger.info(f"Running Pandoc with {len(cmd)} arguments (streaming)")
+                
+                # Same budget as the blocking path, covering the whole render rather than one read
+                deadline = loop.time() + PANDOC_TIMEOUT
+                
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                stderr_task = asyncio.create_task(proc.stderr.read())
+                try:
+                    proc.stdin.write(markdown_bytes)
+                    await proc.stdin.drain()
+                    proc.stdin.close()
+                    
+                    chunk = await asyncio.wait_for(proc.stdout.read(PDF_STREAM_CHUNK_SIZE), deadline - loop.time())
+                    if chunk:
+                        logger.info("PDF generation started, streaming output")
+                        # The last chunk is held back until Pandoc's exit status is known
+                        while True:
+                            next_chunk = await asyncio.wait_for(
+                                proc.stdout.read(PDF_STREAM_CHUNK_SIZE), deadline - loop.time()
+                            )
+                            if not next_chunk:
+                                break
+                            yield chunk
+                            chunk = next_chunk
+                        if await asyncio.wait_for(proc.wait(), deadline - loop.time()) != 0:
+                            stderr = await stderr_task
+                            raise Exception(
+                                f"Pandoc failed after partial output: {stderr.decode('utf-8', 'replace')}"
+                            )
+                        yield chunk
+                        return
+                    
+                    await asyncio.wait_for(proc.wait(), deadline - loop.time())
+                    stderr = await stderr_task
+                    logger.error(f"Pandoc error: {stderr.decode('utf-8', 'replace')}")
+                except asyncio.TimeoutError:
+                    raise Exception(f"Pandoc timed out after {PANDOC_TIMEOUT} s")
+                finally:
+                    if proc.returncode is None:
+                        proc.kill()
+                        await proc.wait()
+                    if not stderr_task.done():
+                        stderr_task.cancel()
+        
+        raise Exception(f"Pandoc failed: {stderr.decode('utf-8', 'replace')}")
 
 
 # Singleton instance
@@ -463,7 +463,7 @@ class RAGService:
     
     async def query_with_llm(self, question: str, context_docs: int = 3) -> Dict[str, Any]:
         """Consulta usando RAG + Groq LLM con fuentes bibliográficas"""
-        import httpx
+        from .http_clients import get_groq_client
         
         relevant_docs = self.search(question, n_results=context_docs)
         
@@ -508,27 +508,27 @@ Evita usar asteriscos o markdown complejo. Cita las fuentes cuando sea pertinent
 Responde siempre en español."""
 
         try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.post(
-                    GROQ_API_URL,
-                    headers={"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"},
-                    json={
-                        "model": GROQ_MODEL,
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": f"Basándote en estas fuentes médicas:\n\n{context}\n\nResponde a: {question}"}
-                        ],
-                        "temperature": 0.3,
-                        "max_tokens": 1000
-                    }
-                )
-                
-                if response.status_code == 200:
-                    return {
-                        "answer": response.json()["choices"][0]["message"]["content"],
-                        "sources": sources,
-                        "excerpts": excerpts
-                    }
+            response = await get_groq_client().post(
+                GROQ_API_URL,
+                headers={"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"},
+                json={
+                    "model": GROQ_MODEL,
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": f"Basándote en estas fuentes médicas:\n\n{context}\n\nResponde a: {question}"}
+                    ],
+                    "temperature": 0.3,
+                    "max_tokens": 1000
+                },
+                timeout=15.0
+            )
+            
+            if response.status_code == 200:
+                return {
+                    "answer": response.json()["choices"][0]["message"]["content"],
+                    "sources": sources,
+                    "excerpts": excerpts
+                }
         except Exception as e:
             logger.error(f"Error Groq: {e}")
         
@@ -0,0 +1,126 @@
+"""
+============================================================================
+REPORT FALLBACK - Sample metrics when InfluxDB is unavailable
+============================================================================
+Only imported by report_routes when a query fails, so the normal request
+path never loads it.
+============================================================================
+"""
+
+from datetime import datetime
+from typing import Dict, Any
+
+import numpy as np
+
+from .report_routes import HOSPITALES, HOSPITAL_BASE_ARRIVALS, _trend_records
+
+# Random generator for sample data
+_rng = np.random.default_rng()
+
+
+# Scalar sample metrics as (base, jitter low, jitter high), drawn in a single call
+_SAMPLE_SCALARS = np.array([
+    (15.3, -3, 5),        # avg_wait_time
+    (0.62, -0.1, 0.15),   # avg_saturation
+    (96.4, -2, 2),        # efficiency
+    (0.65, -0.1, 0.15),   # chuac saturacion
+    (18, -3, 5),          # chuac tiempo_espera
+    (0.72, -0.1, 0.1),    # modelo saturacion
+    (12, -2, 4),          # modelo tiempo_espera
+    (0.58, -0.1, 0.12),   # san_rafael saturacion
+    (10, -2, 3),          # san_rafael tiempo_espera
+    (3.2, -0.5, 1),       # Ventanilla
+    (8.5, -1, 2),         # Triaje
+    (22.4, -3, 5),        # Consulta
+]).T
+# Wait-time stages, matching the last rows of _SAMPLE_SCALARS
+WAIT_TIME_STAGES = ("Ventanilla", "Triaje", "Consulta")
+
+
+def generate_sample_metrics(start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+    """Generate sample metrics when InfluxDB is unavailable."""
+    num_days = (end_date - start_date).days + 1
+    
+    # Generate daily trend for every hospital in a single draw
+    bases = np.array(HOSPITAL_BASE_ARRIVALS)
+    values = bases[:, None] + _rng.integers(-15, 21, size=(len(HOSPITALES), num_days))
+    daily_trend = _trend_records(values)
+    
+    # Calculate totals
+    chuac_total, modelo_total, san_rafael_total = values.sum(axis=1).tolist()
+    
+    # Jitter every scalar metric at once
+    base, low, high = _SAMPLE_SCALARS
+    (
+        avg_wait, avg_sat, efficiency,
+        chuac_sat, chuac_wait, modelo_sat, modelo_wait, san_rafael_sat, san_rafael_wait,
+        ventanilla_wait, triaje_wait, consulta_wait,
+    ) = (base + _rng.uniform(low, high)).tolist()
+    sergas_available, sergas_assigned = _rng.integers((12, 28), (23, 39)).tolist()
+    
+    return {
+        "total_patients": chuac_total + modelo_total + san_rafael_total,
+        "patients_treated": int((chuac_total + modelo_total + san_rafael_total) * 0.96),
+        "patients_derived": int((chuac_total + modelo_total + san_rafael_total) * 0.02),
+        "avg_wait_time": avg_wait,
+        "avg_saturation": avg_sat,
+        "efficiency": efficiency,
+        "hospitals": {
+            "chuac": {
+                "llegadas": chuac_total,
+                "atendidos": int(chuac_total * 0.97),
+                "derivados": int(chuac_total * 0.015),
+                "saturacion": chuac_sat,
+                "tiempo_espera": chuac_wait,
+            },
+            "modelo": {
+                "llegadas": modelo_total,
+                "atendidos": int(modelo_total * 0.97),
+                "derivados": int(modelo_total * 0.02),
+                "saturacion": modelo_sat,
+                "tiempo_espera": modelo_wait,
+            },
+            "san_rafael": {
+                "llegadas": san_rafael_total,
+                "atendidos": int(san_rafael_total * 0.96),
+                "derivados": int(san_rafael_total * 0.025),
+                "saturacion": san_rafael_sat,
+                "tiempo_espera": san_rafael_wait,
+            },
+        },
+        "daily_trend": daily_trend,
+        "hourly_data": [],
+        "wait_times": {
+            "Ventanilla": ventanilla_wait,
+            "Triaje": triaje_wait,
+            "Consulta": consulta_wait,
+        },
+        "incidents": [
+            {"tipo": "accidente_trafico", "pacientes": 4, "hospital": "chuac", "impacto": "medio"},
+            {"tipo": "intoxicacion", "pacientes": 8, "hospital": "modelo", "impacto": "alto"},
+        ] if num_days > 3 else [],
+        "derivations": [
+            {"origen": "modelo", "destino": "chuac", "motivo": "gravedad", "count": 5},
+            {"origen": "san_rafael", "destino": "chuac", "motivo": "capacidad", "count": 3},
+        ],
+        "triage_distribution": {
+            "rojo": int(chuac_total * 0.05),
+            "naranja": int(chuac_total * 0.15),
+            "amarillo": int(chuac_total * 0.35),
+            "verde": int(chuac_total * 0.40),
+            "azul": int(chuac_total * 0.05),
+        },
+        "staff": {
+            "sergas_total": 50,
+            "sergas_available": sergas_available,
+            "sergas_assigned": sergas_assigned,
+        },
+        "data_source": "sample",
+        "period_days": num_days,
+    }
+
+
+def sample_wait_times() -> Dict[str, float]:
+    """Jittered wait time per stage, for reports whose data has none."""
+    base, low, high = _SAMPLE_SCALARS[:, -len(WAIT_TIME_STAGES):]
+    return dict(zip(WAIT_TIME_STAGES, (base + _rng.uniform(low, high)).tolist()))
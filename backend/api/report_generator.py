@@ -9,7 +9,7 @@ Generates visual PDF reports with hospital metrics using ReportLab.
 import io
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import BinaryIO, Dict, List, Optional, Tuple
 import matplotlib
 matplotlib.use('Agg')  # Non-interactive backend
 import matplotlib.pyplot as plt
@@ -653,8 +653,9 @@ class HospitalReportGenerator:
         metrics: Dict,
         start_date: datetime,
         end_date: datetime,
-        charts: Optional[Dict[str, io.BytesIO]] = None
-    ) -> io.BytesIO:
+        charts: Optional[Dict[str, io.BytesIO]] = None,
+        output: Optional[BinaryIO] = None
+    ) -> BinaryIO:
         """
         Generate a complete professional PDF report.
         
@@ -663,11 +664,13 @@ class HospitalReportGenerator:
             metrics: Dictionary containing all metrics data
             start_date: Report period start
             end_date: Report period end
+            charts: Pre-generated chart buffers to reuse
+            output: File-like target for the PDF (e.g. a SpooledTemporaryFile)
             
         Returns:
-            BytesIO buffer containing the PDF
+            The output target (a new BytesIO by default), rewound to the start
         """
-        buffer = io.BytesIO()
+        buffer = output if output is not None else io.BytesIO()
         
         doc = SimpleDocTemplate(
             buffer,
@@ -1503,14 +1506,20 @@ class PainterAgent(HospitalReportGenerator):
         charts: Dict[str, io.BytesIO],
         period_type: str,
         start_date: datetime,
-        end_date: datetime
-    ) -> io.BytesIO:
+        end_date: datetime,
+        output: Optional[BinaryIO] = None
+    ) -> BinaryIO:
         """Phase 2: Assemble PDF with finalized content and pre-generated charts."""
         # Inject refined content into metrics for the generator to use
         metrics['llm_analysis'] = content
         
+        # Rewind only the buffers that were read since they were rendered
+        for buf in (charts or {}).values():
+            if buf and buf.tell():
+                buf.seek(0)
+        
         # Call parent generate_report, passing the pre-generated charts
-        return self.generate_report(period_type, metrics, start_date, end_date, charts=charts)
+        return self.generate_report(period_type, metrics, start_date, end_date, charts=charts, output=output)
 
 
 # ============================================================================
@@ -13,11 +13,13 @@ Endpoints:
 """
 
 from fastapi import APIRouter, HTTPException, Query
-from pydantic import BaseModel
-from typing import Optional, Literal
+from pydantic import BaseModel, TypeAdapter
+from typing import List, Optional, Literal
 from datetime import datetime
+import asyncio
 import logging
-import json
+
+import orjson
 
 import sys
 import os
@@ -171,6 +173,16 @@ async def set_simulation_speed(config: SpeedConfig):
     }
 
 
+_PATIENT_ARRIVALS = TypeAdapter(List[PatientArrival])
+
+
+def _load_sample_sync(path: str) -> List[bytes]:
+    """Lee, valida y serializa un fichero de muestra en una sola pasada"""
+    with open(path, 'rb') as f:
+        arrivals = _PATIENT_ARRIVALS.validate_python(orjson.loads(f.read()))
+    return [orjson.dumps(arrival.model_dump()) for arrival in arrivals]
+
+
 @router.post("/load-sample", response_model=LoadSampleResponse)
 async def load_sample(
     sample_type: Literal["normal", "heavy"] = Query(default="normal")
@@ -191,15 +203,10 @@ async def load_sample(
         raise HTTPException(status_code=404, detail=f"Archivo de muestra no encontrado: {sample_file}")
 
     try:
-        with open(sample_path, 'r') as f:
-            patients_data = json.load(f)
-
-        count = 0
-        for patient_data in patients_data:
-            arrival = PatientArrival(**patient_data)
-            kafka.produce("patient-arrivals", arrival)
-            count += 1
+        # Lectura, validación y serialización fuera del event loop (heavy: varios MB)
+        payloads = await asyncio.to_thread(_load_sample_sync, sample_path)
 
+        count = kafka.produce_many("patient-arrivals", payloads)
         kafka.flush()
 
         simulation_state["patients_generated"] += count
@@ -210,7 +217,7 @@ async def load_sample(
             message=f"Cargados {count} pacientes desde {sample_file}"
         )
 
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         raise HTTPException(status_code=400, detail=f"Error en formato JSON: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error cargando muestra: {e}")
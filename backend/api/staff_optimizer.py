@@ -16,18 +16,28 @@ Restricciones:
 
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
-from datetime import datetime
+from functools import lru_cache
+import copy
 import logging
+import threading
 
 try:
     from pulp import (
         LpProblem, LpMinimize, LpVariable, LpBinary, LpStatus,
-        lpSum, value, PULP_CBC_CMD
+        lpSum, PULP_CBC_CMD
     )
     PULP_AVAILABLE = True
 except ImportError:
     PULP_AVAILABLE = False
 
+try:
+    import numpy as np
+    from scipy.optimize import linprog
+    from scipy.sparse import csr_matrix
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 
@@ -52,12 +62,18 @@ NUM_CONSULTAS = 10
 MAX_MEDICOS_CONSULTA = 4
 MAX_MEDICOS_SERGAS_POR_CONSULTA = 3
 
+# Tamaño máximo (médicos x consultas) resuelto sin lanzar el solver LP
+MAX_VARIABLES_VORAZ = 500
+
+# Resultados de optimización recientes memorizados (por huella del problema)
+CACHE_OPTIMIZACION_SIZE = 256
+
 
 # ============================================================================
 # MODELOS DE DATOS
 # ============================================================================
 
-@dataclass
+@dataclass(slots=True)
 class ConsultaEstado:
     """Estado actual de una consulta"""
     numero: int
@@ -67,7 +83,7 @@ class ConsultaEstado:
     tiempo_medio_espera: float  # Minutos
 
 
-@dataclass
+@dataclass(slots=True)
 class MedicoSergas:
     """Médico disponible en lista SERGAS"""
     medico_id: str
@@ -76,7 +92,7 @@ class MedicoSergas:
     asignado_a_consulta: Optional[int]
 
 
-@dataclass
+@dataclass(slots=True)
 class Recomendacion:
     """Recomendación de asignación"""
     medico_id: str
@@ -87,7 +103,7 @@ class Recomendacion:
     accion: str  # "asignar" o "reasignar"
 
 
-@dataclass
+@dataclass(slots=True)
 class ResultadoOptimizacion:
     """Resultado del algoritmo de optimización"""
     exito: bool
@@ -145,10 +161,157 @@ def prioridad_desde_impacto(reduccion_minutos: float) -> int:
         return 3  # Baja
 
 
+# ============================================================================
+# CACHÉ DEL MODELO
+# ============================================================================
+
+class _ModelCache:
+    """
+    Modelo PuLP reutilizado entre llamadas con la misma forma (médicos x consultas).
+    
+    Variables y restricciones se construyen una sola vez por forma; en cada
+    llamada solo cambian los coeficientes del objetivo y el RHS de capacidad,
+    y CBC arranca desde la solución anterior (warm start).
+    """
+    
+    def __init__(self):
+        self.forma: Optional[Tuple[int, int]] = None
+        self.prob = None
+        self.x: Dict[Tuple[int, int], "LpVariable"] = {}
+        self.capacidad: List = []
+        self.lock = threading.Lock()  # el modelo es mutable: una resolución a la vez
+    
+    def modelo(self, num_medicos: int, num_consultas: int):
+        """Devuelve (prob, x, restricciones de capacidad), reconstruyendo si cambia la forma"""
+        if self.forma != (num_medicos, num_consultas):
+            M = range(num_medicos)
+            C = range(num_consultas)
+            
+            prob = LpProblem("Distribucion_Personal_SERGAS", LpMinimize)
+            
+            # Variables de decisión: x[m,c] = 1 si médico m asignado a consulta c
+            x = {(m, c): LpVariable(f"x_{m}_{c}", cat=LpBinary) for m in M for c in C}
+            
+            # R1: Cada médico puede asignarse a máximo 1 consulta
+            for m in M:
+                prob += lpSum([x[m, c] for c in C]) <= 1, f"medico_{m}"
+            
+            # R2: Capacidad SERGAS de cada consulta (RHS actualizado en cada llamada)
+            capacidad = []
+            for c in C:
+                restriccion = lpSum([x[m, c] for m in M]) <= 0
+                prob += restriccion, f"capacidad_{c}"
+                capacidad.append(restriccion)
+            
+            self.prob, self.x, self.capacidad = prob, x, capacidad
+            self.forma = (num_medicos, num_consultas)
+        
+        return self.prob, self.x, self.capacidad
+
+
+_model_cache = _ModelCache()
+
+
 # ============================================================================
 # ALGORITMO DE OPTIMIZACIÓN
 # ============================================================================
 
+def _resolver_voraz(
+    beneficios: List[float],
+    limites: List[int],
+    num_medicos: int
+) -> Tuple[str, List[Tuple[int, int]]]:
+    """
+    Resuelve la asignación sin solver: rellena las consultas de mayor beneficio.
+    
+    El beneficio de cada consulta no depende de cuántos médicos reciba, así que
+    el óptimo del LP es asignar los médicos, en orden, a las consultas con mayor
+    beneficio positivo hasta agotar su capacidad.
+    """
+    orden = sorted(range(len(beneficios)), key=lambda c: -beneficios[c])
+    
+    asignaciones = []
+    m = 0
+    for c in orden:
+        if m >= num_medicos or beneficios[c] <= 0:
+            break
+        for _ in range(min(limites[c], num_medicos - m)):
+            asignaciones.append((m, c))
+            m += 1
+    
+    return "Optimal", asignaciones
+
+
+def _resolver_highs(
+    beneficios: List[float],
+    limites: List[int],
+    num_medicos: int
+) -> Tuple[str, List[Tuple[int, int]]]:
+    """
+    Resuelve la asignación con HiGHS (scipy.optimize.linprog), en proceso.
+    
+    La matriz de restricciones es la de incidencia de un grafo bipartito
+    (médicos x consultas), totalmente unimodular: la relajación continua con
+    0 <= x <= 1 tiene vértices enteros y el simplex devuelve una solución binaria.
+    Variable x[m,c] en la posición m * num_consultas + c.
+    """
+    num_consultas = len(beneficios)
+    num_vars = num_medicos * num_consultas
+    columnas = np.arange(num_vars)
+    
+    # R1: una fila por médico (sus num_consultas variables consecutivas)
+    # R2: una fila por consulta (cada num_consultas-ésima variable)
+    filas = np.concatenate((columnas // num_consultas, num_medicos + columnas % num_consultas))
+    A_ub = csr_matrix(
+        (np.ones(2 * num_vars), (filas, np.concatenate((columnas, columnas)))),
+        shape=(num_medicos + num_consultas, num_vars)
+    )
+    b_ub = np.concatenate((np.ones(num_medicos), limites))
+    
+    res = linprog(
+        -np.tile(beneficios, num_medicos),
+        A_ub=A_ub,
+        b_ub=b_ub,
+        bounds=(0, 1),
+        method="highs-ds"
+    )
+    if res.status != 0:
+        return res.message, []
+    
+    elegidas = np.flatnonzero(res.x > 0.5)
+    return "Optimal", [(int(i) // num_consultas, int(i) % num_consultas) for i in elegidas]
+
+
+def _resolver_cbc(
+    beneficios: List[float],
+    limites: List[int],
+    num_medicos: int
+) -> Tuple[str, List[Tuple[int, int]]]:
+    """Resuelve la asignación con PuLP/CBC sobre el modelo cacheado (sin SciPy)"""
+    M = range(num_medicos)
+    C = range(len(beneficios))
+    
+    with _model_cache.lock:
+        prob, x, capacidad = _model_cache.modelo(num_medicos, len(beneficios))
+        
+        prob.setObjective(lpSum([-beneficios[c] * x[m, c] for m in M for c in C]))
+        for restriccion, limite in zip(capacidad, limites):
+            restriccion.changeRHS(limite)
+        
+        solver = PULP_CBC_CMD(msg=0, warmStart=True)  # Silencioso
+        prob.solve(solver)
+        estado = LpStatus[prob.status]
+        
+        # R1: como mucho una consulta por médico, se para en la primera elegida
+        asignaciones = []
+        for m in M:
+            elegida = next((c for c in C if (x[m, c].varValue or 0) > 0.5), None)
+            if elegida is not None:
+                asignaciones.append((m, elegida))
+    
+    return estado, asignaciones
+
+
 def optimizar_distribucion(
     consultas: List[ConsultaEstado],
     medicos_disponibles: List[MedicoSergas]
@@ -156,6 +319,9 @@ def optimizar_distribucion(
     """
     Ejecuta el algoritmo de optimización para distribuir médicos SERGAS.
     
+    Los resultados se memorizan por la huella del problema: los sondeos del
+    dashboard repiten las mismas colas y médicos libres entre llamadas.
+    
     Args:
         consultas: Estado actual de las 10 consultas CHUAC
         medicos_disponibles: Médicos SERGAS disponibles para asignar
@@ -163,8 +329,46 @@ def optimizar_distribucion(
     Returns:
         ResultadoOptimizacion con recomendaciones
     """
+    # Filtrar médicos no asignados
+    medicos_libres = [m for m in medicos_disponibles if m.asignado_a_consulta is None]
+    
+    # Copia: el llamador puede modificar el resultado sin tocar la caché
+    return copy.deepcopy(_optimizar_cacheado(_huella(consultas, medicos_libres)))
+
+
+def _huella(
+    consultas: List[ConsultaEstado],
+    medicos_libres: List[MedicoSergas]
+) -> Tuple:
+    """Todo lo que determina el resultado: colas, plantilla y médicos libres en orden"""
+    return (
+        tuple((c.numero, c.medicos_base, c.medicos_sergas, c.cola_actual) for c in consultas),
+        tuple((m.medico_id, m.nombre) for m in medicos_libres),
+    )
+
+
+@lru_cache(maxsize=CACHE_OPTIMIZACION_SIZE)
+def _optimizar_cacheado(huella: Tuple) -> ResultadoOptimizacion:
+    """Resuelve el problema reconstruido desde su huella (memorizado)"""
+    consultas_huella, medicos_huella = huella
+    consultas = [
+        ConsultaEstado(numero=n, medicos_base=base, medicos_sergas=sergas, cola_actual=cola, tiempo_medio_espera=0.0)
+        for n, base, sergas, cola in consultas_huella
+    ]
+    medicos_libres = [
+        MedicoSergas(medico_id=medico_id, nombre=nombre, especialidad=None, asignado_a_consulta=None)
+        for medico_id, nombre in medicos_huella
+    ]
+    return _optimizar(consultas, medicos_libres)
+
+
+def _optimizar(
+    consultas: List[ConsultaEstado],
+    medicos_libres: List[MedicoSergas]
+) -> ResultadoOptimizacion:
+    """Modelo y resolución de la asignación para los médicos libres dados"""
     
-    if not PULP_AVAILABLE:
+    if not (SCIPY_AVAILABLE or PULP_AVAILABLE):
         return ResultadoOptimizacion(
             exito=False,
             recomendaciones=[],
@@ -172,161 +376,127 @@ def optimizar_distribucion(
             metricas_actuales={},
             metricas_proyectadas={},
             mejora_estimada=0.0,
-            mensaje="PuLP no está instalado. Ejecute: pip install pulp"
+            mensaje="Ni SciPy ni PuLP están instalados. Ejecute: pip install scipy"
         )
     
-    # Filtrar médicos no asignados
-    medicos_libres = [m for m in medicos_disponibles if m.asignado_a_consulta is None]
-    
     if not medicos_libres:
-        return ResultadoOptimizacion(
-            exito=True,
-            recomendaciones=[],
-            estado_actual=_construir_estado_actual(consultas),
-            metricas_actuales=_calcular_metricas(consultas),
-            metricas_proyectadas=_calcular_metricas(consultas),
-            mejora_estimada=0.0,
-            mensaje="No hay médicos SERGAS disponibles para asignar"
-        )
+        return _resultado_sin_cambios(consultas, "No hay médicos SERGAS disponibles para asignar")
     
     # Calcular necesidad de cada consulta
     consultas_con_necesidad = [c for c in consultas if c.cola_actual > 0]
     
     if not consultas_con_necesidad:
-        return ResultadoOptimizacion(
-            exito=True,
-            recomendaciones=[],
-            estado_actual=_construir_estado_actual(consultas),
-            metricas_actuales=_calcular_metricas(consultas),
-            metricas_proyectadas=_calcular_metricas(consultas),
-            mejora_estimada=0.0,
-            mensaje="No hay colas en ninguna consulta. Distribución óptima."
-        )
+        return _resultado_sin_cambios(consultas, "No hay colas en ninguna consulta. Distribución óptima.")
     
     # =========================================================================
     # MODELO DE PROGRAMACIÓN LINEAL
     # =========================================================================
     
-    prob = LpProblem("Distribucion_Personal_SERGAS", LpMinimize)
-    
-    # Índices
-    M = range(len(medicos_libres))  # Médicos
-    C = range(len(consultas))       # Consultas
-    
-    # Variables de decisión: x[m,c] = 1 si médico m asignado a consulta c
-    x = {}
-    for m in M:
-        for c in C:
-            x[m, c] = LpVariable(f"x_{m}_{c}", cat=LpBinary)
-    
     # -------------------------------------------------------------------------
     # FUNCIÓN OBJETIVO: Minimizar tiempo de espera total ponderado
     # -------------------------------------------------------------------------
     # Aproximación lineal: minimizar (cola * peso) donde peso favorece
     # asignar a consultas con más carga
     
-    # Calcular pesos (carga relativa de cada consulta)
-    pesos = []
-    for c, consulta in enumerate(consultas):
-        total_medicos_actual = consulta.medicos_base + consulta.medicos_sergas
-        carga = calcular_carga_consulta(consulta.cola_actual, total_medicos_actual)
-        pesos.append(carga * consulta.cola_actual)
-    
     # Objetivo: maximizar reducción de carga (minimizar -beneficio)
     # Beneficio de asignar médico a consulta = cola / (medicos_actuales + 1)
-    prob += lpSum([
-        -consultas[c].cola_actual / max(1, consultas[c].medicos_base + consultas[c].medicos_sergas + 1)
-        * x[m, c]
-        for m in M
-        for c in C
-    ])
+    beneficios = [
+        consulta.cola_actual / max(1, consulta.medicos_base + consulta.medicos_sergas + 1)
+        for consulta in consultas
+    ]
     
     # -------------------------------------------------------------------------
     # RESTRICCIONES
     # -------------------------------------------------------------------------
     
-    # R1: Cada médico puede asignarse a máximo 1 consulta
-    for m in M:
-        prob += lpSum([x[m, c] for c in C]) <= 1
+    # R1: Cada médico puede asignarse a máximo 1 consulta (fija en el modelo)
     
     # R2: Cada consulta puede recibir máximo 3 médicos SERGAS adicionales
-    for c in C:
-        consulta = consultas[c]
+    limites = []
+    for consulta in consultas:
         capacidad_restante = MAX_MEDICOS_SERGAS_POR_CONSULTA - consulta.medicos_sergas
         capacidad_restante = max(0, capacidad_restante)  # No negativo
         
         # También respetar límite total de 4
         limite_total = MAX_MEDICOS_CONSULTA - consulta.medicos_base - consulta.medicos_sergas
-        limite = min(capacidad_restante, limite_total)
-        
-        prob += lpSum([x[m, c] for m in M]) <= limite
+        limites.append(min(capacidad_restante, limite_total))
+    
+    # -------------------------------------------------------------------------
+    # MODELO REDUCIDO
+    # -------------------------------------------------------------------------
+    # Solo consultas con hueco y cola (el resto tienen x = 0 en el óptimo) y,
+    # como todos los médicos son intercambiables, solo tantos como huecos haya
+    
+    activas = [c for c in range(len(consultas)) if limites[c] > 0 and beneficios[c] > 0]
+    num_medicos = min(len(medicos_libres), sum(limites[c] for c in activas))
+    beneficios_activos = [beneficios[c] for c in activas]
+    limites_activos = [limites[c] for c in activas]
     
     # -------------------------------------------------------------------------
     # RESOLVER
     # -------------------------------------------------------------------------
     
-    solver = PULP_CBC_CMD(msg=0)  # Silencioso
-    prob.solve(solver)
+    if num_medicos == 0:
+        estado, asignaciones = "Optimal", []
+    elif num_medicos * len(activas) <= MAX_VARIABLES_VORAZ:
+        estado, asignaciones = _resolver_voraz(beneficios_activos, limites_activos, num_medicos)
+    elif SCIPY_AVAILABLE:
+        estado, asignaciones = _resolver_highs(beneficios_activos, limites_activos, num_medicos)
+    else:
+        estado, asignaciones = _resolver_cbc(beneficios_activos, limites_activos, num_medicos)
     
-    if LpStatus[prob.status] != "Optimal":
-        return ResultadoOptimizacion(
-            exito=False,
-            recomendaciones=[],
-            estado_actual=_construir_estado_actual(consultas),
-            metricas_actuales=_calcular_metricas(consultas),
-            metricas_proyectadas=_calcular_metricas(consultas),
-            mejora_estimada=0.0,
-            mensaje=f"No se encontró solución óptima: {LpStatus[prob.status]}"
-        )
+    if estado != "Optimal":
+        return _resultado_sin_cambios(consultas, f"No se encontró solución óptima: {estado}", exito=False)
     
     # -------------------------------------------------------------------------
     # EXTRAER RECOMENDACIONES
     # -------------------------------------------------------------------------
     
+    # Tiempos de espera del estado actual: una sola vez por optimización
+    tiempos_actuales = _tiempos_espera(consultas)
+    
     recomendaciones = []
-    consultas_proyectadas = [
-        ConsultaEstado(
-            numero=c.numero,
-            medicos_base=c.medicos_base,
-            medicos_sergas=c.medicos_sergas,
-            cola_actual=c.cola_actual,
-            tiempo_medio_espera=c.tiempo_medio_espera
-        )
-        for c in consultas
-    ]
+    medicos_nuevos = [0] * len(consultas)
     
-    for m in M:
-        for c in C:
-            if value(x[m, c]) == 1:
-                medico = medicos_libres[m]
-                consulta = consultas[c]
-                
-                # Calcular impacto
-                medicos_antes = consulta.medicos_base + consulta.medicos_sergas
-                medicos_despues = medicos_antes + 1
-                
-                tiempo_antes = calcular_tiempo_espera(consulta.cola_actual, medicos_antes)
-                tiempo_despues = calcular_tiempo_espera(consulta.cola_actual, medicos_despues)
-                reduccion = tiempo_antes - tiempo_despues
-                
-                recomendaciones.append(Recomendacion(
-                    medico_id=medico.medico_id,
-                    medico_nombre=medico.nombre,
-                    consulta_destino=consulta.numero,
-                    prioridad=prioridad_desde_impacto(reduccion),
-                    impacto_estimado=f"Reduce espera en ~{reduccion:.0f} min",
-                    accion="asignar"
-                ))
-                
-                # Actualizar proyección
-                consultas_proyectadas[c].medicos_sergas += 1
+    for m, c_activa in asignaciones:
+        c = activas[c_activa]
+        medico = medicos_libres[m]
+        consulta = consultas[c]
+        
+        # Calcular impacto
+        medicos_despues = consulta.medicos_base + consulta.medicos_sergas + 1
+        
+        tiempo_antes = tiempos_actuales[c]
+        tiempo_despues = calcular_tiempo_espera(consulta.cola_actual, medicos_despues)
+        reduccion = tiempo_antes - tiempo_despues
+        
+        recomendaciones.append(Recomendacion(
+            medico_id=medico.medico_id,
+            medico_nombre=medico.nombre,
+            consulta_destino=consulta.numero,
+            prioridad=prioridad_desde_impacto(reduccion),
+            impacto_estimado=f"Reduce espera en ~{reduccion:.0f} min",
+            accion="asignar"
+        ))
+        
+        # Actualizar proyección
+        medicos_nuevos[c] += 1
+    
+    # Proyección: solo cambia el tiempo de las consultas que reciben médicos
+    tiempos_proyectados = list(tiempos_actuales)
+    for c, nuevos in enumerate(medicos_nuevos):
+        if nuevos:
+            consulta = consultas[c]
+            tiempos_proyectados[c] = calcular_tiempo_espera(
+                consulta.cola_actual, consulta.medicos_base + consulta.medicos_sergas + nuevos
+            )
     
     # Ordenar por prioridad
     recomendaciones.sort(key=lambda r: (r.prioridad, -r.consulta_destino))
     
     # Calcular métricas
-    metricas_actuales = _calcular_metricas(consultas)
-    metricas_proyectadas = _calcular_metricas(consultas_proyectadas)
+    metricas_actuales = _calcular_metricas(consultas, tiempos_actuales)
+    metricas_proyectadas = _calcular_metricas(consultas, tiempos_proyectados)
     
     # Mejora estimada
     if metricas_actuales["tiempo_espera_total"] > 0:
@@ -340,7 +510,7 @@ def optimizar_distribucion(
     return ResultadoOptimizacion(
         exito=True,
         recomendaciones=recomendaciones,
-        estado_actual=_construir_estado_actual(consultas),
+        estado_actual=_construir_estado_actual(consultas, tiempos_actuales),
         metricas_actuales=metricas_actuales,
         metricas_proyectadas=metricas_proyectadas,
         mejora_estimada=round(mejora, 1),
@@ -352,8 +522,35 @@ def optimizar_distribucion(
 # FUNCIONES AUXILIARES INTERNAS
 # ============================================================================
 
-def _construir_estado_actual(consultas: List[ConsultaEstado]) -> Dict:
-    """Construye diccionario con estado actual de consultas"""
+def _tiempos_espera(consultas: List[ConsultaEstado]) -> List[float]:
+    """Tiempo de espera estimado de cada consulta con sus médicos actuales"""
+    return [
+        calcular_tiempo_espera(c.cola_actual, c.medicos_base + c.medicos_sergas)
+        for c in consultas
+    ]
+
+
+def _resultado_sin_cambios(
+    consultas: List[ConsultaEstado],
+    mensaje: str,
+    exito: bool = True
+) -> ResultadoOptimizacion:
+    """Resultado sin recomendaciones: la proyección coincide con el estado actual"""
+    tiempos = _tiempos_espera(consultas)
+    metricas = _calcular_metricas(consultas, tiempos)
+    return ResultadoOptimizacion(
+        exito=exito,
+        recomendaciones=[],
+        estado_actual=_construir_estado_actual(consultas, tiempos),
+        metricas_actuales=metricas,
+        metricas_proyectadas=dict(metricas),
+        mejora_estimada=0.0,
+        mensaje=mensaje
+    )
+
+
+def _construir_estado_actual(consultas: List[ConsultaEstado], tiempos_espera: List[float]) -> Dict:
+    """Construye diccionario con estado actual de consultas (tiempos de _tiempos_espera)"""
     return {
         "consultas": [
             {
@@ -362,28 +559,22 @@ def _construir_estado_actual(consultas: List[ConsultaEstado]) -> Dict:
                 "medicos_base": c.medicos_base,
                 "medicos_sergas": c.medicos_sergas,
                 "cola": c.cola_actual,
-                "tiempo_espera_estimado": round(
-                    calcular_tiempo_espera(c.cola_actual, c.medicos_base + c.medicos_sergas), 1
-                )
+                "tiempo_espera_estimado": round(tiempo, 1)
             }
-            for c in consultas
+            for c, tiempo in zip(consultas, tiempos_espera)
         ],
         "total_medicos_sergas_asignados": sum(c.medicos_sergas for c in consultas),
         "total_cola": sum(c.cola_actual for c in consultas)
     }
 
 
-def _calcular_metricas(consultas: List[ConsultaEstado]) -> Dict:
-    """Calcula métricas agregadas"""
-    tiempos_espera = []
-    for c in consultas:
-        total_medicos = c.medicos_base + c.medicos_sergas
-        tiempo = calcular_tiempo_espera(c.cola_actual, total_medicos)
-        tiempos_espera.append(tiempo)
+def _calcular_metricas(consultas: List[ConsultaEstado], tiempos_espera: List[float]) -> Dict:
+    """Calcula métricas agregadas a partir de los tiempos de espera de cada consulta"""
+    total = sum(tiempos_espera)
     
     return {
-        "tiempo_espera_total": round(sum(tiempos_espera), 1),
-        "tiempo_espera_promedio": round(sum(tiempos_espera) / len(tiempos_espera), 1) if tiempos_espera else 0,
+        "tiempo_espera_total": round(total, 1),
+        "tiempo_espera_promedio": round(total / len(tiempos_espera), 1) if tiempos_espera else 0,
         "tiempo_espera_max": round(max(tiempos_espera), 1) if tiempos_espera else 0,
         "consultas_con_cola": sum(1 for c in consultas if c.cola_actual > 0),
         "cola_total": sum(c.cola_actual for c in consultas)
@@ -17,6 +17,7 @@ Endpoints:
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict
+from collections import defaultdict
 from uuid import UUID
 from datetime import datetime
 import logging
@@ -283,6 +284,9 @@ async def scale_consulta(
     medicos_previos = consulta.medicos_asignados
     diferencia = to - medicos_previos
 
+    # Eventos de médicos, construidos con los datos previos al commit
+    eventos = []
+
     if diferencia == 0:
         return ScaleConsultaResponse(
             consulta_id=consulta_id,
@@ -312,14 +316,14 @@ async def scale_consulta(
             medico.asignado_a_consulta = consulta_id
             medico.fecha_asignacion = datetime.now()
 
-            kafka.produce("doctor-assigned", DoctorAssigned(
+            eventos.append(("doctor-assigned", DoctorAssigned(
                 medico_id=str(medico.medico_id),
                 medico_nombre=medico.nombre,
                 hospital_id="chuac",
                 consulta_id=consulta_id,
                 medicos_totales_consulta=consulta.medicos_asignados + 1,
                 velocidad_factor=float(consulta.medicos_asignados + 1)
-            ))
+            )))
             consulta.medicos_asignados += 1
 
     else:
@@ -336,7 +340,7 @@ async def scale_consulta(
             medico.fecha_asignacion = None
             consulta.medicos_asignados -= 1
 
-            kafka.produce("doctor-unassigned", DoctorUnassigned(
+            eventos.append(("doctor-unassigned", DoctorUnassigned(
                 medico_id=str(medico.medico_id),
                 medico_nombre=medico.nombre,
                 hospital_id="chuac",
@@ -344,7 +348,7 @@ async def scale_consulta(
                 medicos_restantes_consulta=consulta.medicos_asignados,
                 velocidad_factor=float(max(1, consulta.medicos_asignados)),
                 motivo="escalado"
-            ))
+            )))
 
     # Guardar cambios
     try:
@@ -353,6 +357,10 @@ async def scale_consulta(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error en base de datos: {e}")
 
+    # Emitir eventos solo tras el commit (un fallo no publica asignaciones fantasma)
+    for topic, event in eventos:
+        kafka.produce(topic, event)
+
     # Emitir cambio de capacidad
     kafka.produce("capacity-change", CapacityChange(
         hospital_id=HospitalId.CHUAC,
@@ -426,20 +434,23 @@ async def list_chuac_consultas(db: Session = Depends(get_db)):
         Consulta.hospital_id == "chuac"
     ).order_by(Consulta.numero_consulta).all()
     
+    # Médicos SERGAS asignados al CHUAC, en una sola consulta, agrupados por consulta
+    nombres_por_consulta = defaultdict(list)
+    for numero_consulta, nombre in db.query(
+        ListaSergas.asignado_a_consulta, ListaSergas.nombre
+    ).filter(
+        ListaSergas.asignado_a_hospital == "chuac",
+        ListaSergas.disponible == False
+    ).all():
+        nombres_por_consulta[numero_consulta].append(nombre)
+    
     result = []
     for c in consultas:
-        # Buscar médicos SERGAS asignados a esta consulta
-        medicos_sergas = db.query(ListaSergas).filter(
-            ListaSergas.asignado_a_consulta == c.numero_consulta,
-            ListaSergas.asignado_a_hospital == "chuac",
-            ListaSergas.disponible == False
-        ).all()
-        
         result.append(ConsultaInfo(
             numero_consulta=c.numero_consulta,
             medicos_asignados=c.medicos_asignados,
             velocidad_factor=float(c.medicos_asignados),
-            medicos_sergas=[m.nombre for m in medicos_sergas]
+            medicos_sergas=nombres_por_consulta.get(c.numero_consulta, [])
         ))
     
     return result
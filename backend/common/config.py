@@ -33,6 +33,8 @@ class Settings:
     # Groq (Chatbot)
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
     GROQ_MODEL: str = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+    GROQ_RPM: int = int(os.getenv("GROQ_RPM", "30"))        # peticiones por minuto
+    GROQ_TPM: int = int(os.getenv("GROQ_TPM", "12000"))     # tokens por minuto
 
     # Simulador
     SIMULATION_SPEED: float = float(os.getenv("SIMULATION_SPEED", "1.0"))
@@ -9,7 +9,7 @@ usando los esquemas definidos en schemas.py
 
 import json
 import asyncio
-from typing import Callable, Dict, List, Optional, Any
+from typing import Callable, Dict, Iterable, List, Optional, Any
 from datetime import datetime
 from confluent_kafka import Producer, Consumer, KafkaError, KafkaException
 from confluent_kafka.admin import AdminClient, NewTopic
@@ -143,6 +143,28 @@ class KafkaClient:
         # Flush para envío inmediato (puede ajustarse para batching)
         producer.poll(0)
 
+    def produce_many(self, topic: str, values: Iterable[bytes], poll_every: int = 1000) -> int:
+        """
+        Produce un lote de mensajes ya serializados (sin validación).
+
+        Args:
+            topic: Nombre del topic
+            values: Mensajes codificados en JSON
+            poll_every: Cada cuántos mensajes se atienden los callbacks de entrega
+
+        Returns:
+            Número de mensajes encolados
+        """
+        producer = self.get_producer()
+        count = 0
+        for value in values:
+            producer.produce(topic=topic, value=value, callback=self._delivery_callback)
+            count += 1
+            if count % poll_every == 0:
+                producer.poll(0)
+        producer.poll(0)
+        return count
+
     def flush(self, timeout: float = 10.0):
         """Espera a que todos los mensajes pendientes se envíen"""
         if self._producer:
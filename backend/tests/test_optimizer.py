@@ -126,6 +126,112 @@ def test_limite_medicos_consulta():
     print("✓ Test límite médicos: OK")
 
 
+def test_modelo_reutilizado():
+    """Test de llamadas repetidas con la misma forma (modelo cacheado)"""
+
+    if not PULP_AVAILABLE:
+        return
+
+    # Forzar el camino PuLP/CBC, que es el que reutiliza el modelo
+    limite, scipy = staff_optimizer.MAX_VARIABLES_VORAZ, staff_optimizer.SCIPY_AVAILABLE
+    staff_optimizer.MAX_VARIABLES_VORAZ, staff_optimizer.SCIPY_AVAILABLE = 0, False
+    staff_optimizer._optimizar_cacheado.cache_clear()
+    try:
+        _comprobar_modelo_reutilizado()
+    finally:
+        staff_optimizer.MAX_VARIABLES_VORAZ, staff_optimizer.SCIPY_AVAILABLE = limite, scipy
+        staff_optimizer._optimizar_cacheado.cache_clear()
+
+    print("✓ Test modelo reutilizado: OK")
+
+
+def _comprobar_modelo_reutilizado():
+    medicos = [
+        MedicoSergas(medico_id=str(i), nombre=f"Dr. Test {i}", especialidad="Urgencias", asignado_a_consulta=None)
+        for i in range(2)
+    ]
+
+    # Primera llamada: la consulta 1 tiene 3 huecos y la mayor cola (forma activa 2x2)
+    consultas = [
+        ConsultaEstado(numero=1, medicos_base=1, medicos_sergas=0, cola_actual=10, tiempo_medio_espera=25.0),
+        ConsultaEstado(numero=2, medicos_base=1, medicos_sergas=0, cola_actual=2, tiempo_medio_espera=5.0),
+    ]
+    resultado = optimizar_distribucion(consultas, medicos)
+    assert sorted(r.consulta_destino for r in resultado.recomendaciones) == [1, 1]
+    modelo = staff_optimizer._model_cache.prob
+    assert staff_optimizer._model_cache.forma == (2, 2)
+
+    # Segunda llamada, misma forma activa: a la consulta 1 solo le queda un hueco
+    consultas[0] = ConsultaEstado(numero=1, medicos_base=1, medicos_sergas=2, cola_actual=10, tiempo_medio_espera=25.0)
+    resultado = optimizar_distribucion(consultas, medicos)
+    assert staff_optimizer._model_cache.prob is modelo, "El modelo debe reutilizarse, no reconstruirse"
+    assert sorted(r.consulta_destino for r in resultado.recomendaciones) == [1, 2], \
+        "El límite de capacidad debe actualizarse entre llamadas"
+
+
+def test_resultado_memorizado():
+    """Test de que entradas idénticas reutilizan el resultado sin compartir el objeto"""
+
+    consultas = [
+        ConsultaEstado(numero=1, medicos_base=1, medicos_sergas=0, cola_actual=7, tiempo_medio_espera=15.0),
+        ConsultaEstado(numero=2, medicos_base=1, medicos_sergas=1, cola_actual=4, tiempo_medio_espera=6.0),
+    ]
+    medicos = [
+        MedicoSergas(medico_id="1", nombre="Dr. Test", especialidad="Urgencias", asignado_a_consulta=None),
+    ]
+
+    staff_optimizer._optimizar_cacheado.cache_clear()
+    primero = optimizar_distribucion(consultas, medicos)
+    primero.recomendaciones.clear()
+    segundo = optimizar_distribucion(consultas, medicos)
+
+    assert staff_optimizer._optimizar_cacheado.cache_info().hits == 1
+    assert [r.consulta_destino for r in segundo.recomendaciones] == [1], \
+        "Modificar un resultado no debe alterar la caché"
+
+    print("✓ Test resultado memorizado: OK")
+
+
+def test_voraz_coincide_con_lp():
+    """Test de que la resolución voraz alcanza el mismo beneficio que el LP"""
+
+    consultas = [
+        ConsultaEstado(numero=1, medicos_base=1, medicos_sergas=2, cola_actual=12, tiempo_medio_espera=30.0),
+        ConsultaEstado(numero=2, medicos_base=1, medicos_sergas=0, cola_actual=8, tiempo_medio_espera=20.0),
+        ConsultaEstado(numero=3, medicos_base=1, medicos_sergas=1, cola_actual=3, tiempo_medio_espera=7.5),
+        ConsultaEstado(numero=4, medicos_base=1, medicos_sergas=0, cola_actual=0, tiempo_medio_espera=0.0),
+    ]
+    medicos = [
+        MedicoSergas(medico_id=str(i), nombre=f"Dr. Test {i}", especialidad="Urgencias", asignado_a_consulta=None)
+        for i in range(5)
+    ]
+
+    def beneficio(resultado):
+        por_numero = {c.numero: c for c in consultas}
+        return sum(
+            por_numero[r.consulta_destino].cola_actual
+            / (por_numero[r.consulta_destino].medicos_base + por_numero[r.consulta_destino].medicos_sergas + 1)
+            for r in resultado.recomendaciones
+        )
+
+    voraz = optimizar_distribucion(consultas, medicos)
+
+    limite = staff_optimizer.MAX_VARIABLES_VORAZ
+    staff_optimizer.MAX_VARIABLES_VORAZ = 0
+    staff_optimizer._optimizar_cacheado.cache_clear()
+    try:
+        lp = optimizar_distribucion(consultas, medicos)
+    finally:
+        staff_optimizer.MAX_VARIABLES_VORAZ = limite
+        staff_optimizer._optimizar_cacheado.cache_clear()
+
+    assert voraz.exito and lp.exito
+    assert abs(beneficio(voraz) - beneficio(lp)) < 1e-9, "La solución voraz debe ser óptima"
+    assert 4 not in [r.consulta_destino for r in voraz.recomendaciones]
+
+    print("✓ Test voraz vs LP: OK")
+
+
 if __name__ == "__main__":
     print("=" * 60)
     print("TESTS DEL OPTIMIZADOR DE PERSONAL SERGAS")
@@ -144,6 +250,12 @@ if __name__ == "__main__":
         
         test_limite_medicos_consulta()
         
+        test_modelo_reutilizado()
+        
+        test_resultado_memorizado()
+        
+        test_voraz_coincide_con_lp()
+        
         print("=" * 60)
         print("TODOS LOS TESTS PASARON ✓")
         print("=" * 60)
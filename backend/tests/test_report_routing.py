@@ -0,0 +1,140 @@
+"""
+Test unitario del enrutado de análisis de informes (plantilla vs LLM)
+"""
+
+import sys
+import os
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+
+# Añadir path del repositorio (report_routes usa imports relativos del paquete backend.api)
+repo_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, repo_path)
+
+from backend.api import http_clients
+from backend.api import report_routes
+
+_is_routine = report_routes._is_routine
+_usual_triage_mix = report_routes._usual_triage_mix
+
+# Mezcla de triaje habitual (5/15/40/30/10 %) sobre 1000 pacientes
+TRIAJE_HABITUAL = {"rojo": 50, "naranja": 150, "amarillo": 400, "verde": 300, "azul": 100}
+
+
+def _metricas_tranquilas(**cambios):
+    """Periodo eficiente y sin saturación, con triaje e incidentes reportados"""
+    metricas = {
+        "total_patients": 1000,
+        "efficiency": 97.0,
+        "avg_saturation": 0.40,
+        "hospitals": {"chuac": {"incidencias": 0}},
+        "incidents": [],
+        "triage_distribution": dict(TRIAJE_HABITUAL),
+        "data_source": "sample",
+    }
+    metricas.update(cambios)
+    return metricas
+
+
+def _metricas_influx(campos_por_hospital):
+    """Salida real de _query_influxdb_metrics sobre un InfluxDB simulado (MockTransport)"""
+    filas = [",result,table,_measurement,_field,_value"]
+    for hospital_id, campos in campos_por_hospital.items():
+        for campo, valor in campos.items():
+            filas.append(f",,0,stats_{hospital_id},{campo},{valor}")
+    csv_hospitales = "\n".join(filas) + "\n\n"
+
+    def responder(request):
+        # La tendencia diaria (aggregateWindow) no trae datos: se usa la de ejemplo
+        if b"aggregateWindow" in request.content:
+            return httpx.Response(200, text="")
+        return httpx.Response(200, text=csv_hospitales)
+
+    async def consultar():
+        cliente_previo = http_clients._influx_client
+        http_clients._influx_client = httpx.AsyncClient(transport=httpx.MockTransport(responder))
+        try:
+            fin = datetime.now()
+            return await report_routes._query_influxdb_metrics(fin - timedelta(days=7), fin)
+        finally:
+            await http_clients._influx_client.aclose()
+            http_clients._influx_client = cliente_previo
+
+    return asyncio.run(consultar())
+
+
+def test_rutina_con_datos_reportados():
+    """Un periodo tranquilo con triaje e incidentes reportados va a la plantilla"""
+    assert _is_routine(_metricas_tranquilas())
+    assert not _is_routine(_metricas_tranquilas(incidents=[{"tipo": "accidente"}])), \
+        "Un incidente reportado impide el enrutado directo"
+    assert not _is_routine(_metricas_tranquilas(hospitals={"chuac": {"incidencias": 1}})), \
+        "Una incidencia por hospital impide el enrutado directo"
+
+    print("✓ Test rutina con datos reportados: OK")
+
+
+def test_triaje_desconocido_no_bloquea():
+    """Triaje estimado, vacío o a cero: criterio desconocido, no una mezcla inusual"""
+    vacio = {level: 0 for level in TRIAJE_HABITUAL}
+    estimado = _metricas_tranquilas(estimated_fields=["triage_distribution"])
+
+    assert _usual_triage_mix(estimado) is None
+    assert _usual_triage_mix(_metricas_tranquilas(triage_distribution=vacio)) is None
+    assert _usual_triage_mix(_metricas_tranquilas(triage_distribution={})) is None
+    assert _is_routine(estimado)
+    assert _is_routine(_metricas_tranquilas(triage_distribution=vacio))
+
+    # Una mezcla reportada pero desviada sí impide el enrutado directo
+    desviada = dict(TRIAJE_HABITUAL, rojo=250, amarillo=200)
+    assert _usual_triage_mix(_metricas_tranquilas(triage_distribution=desviada)) is False
+    assert not _is_routine(_metricas_tranquilas(triage_distribution=desviada))
+
+    print("✓ Test triaje desconocido: OK")
+
+
+def test_rutina_con_metricas_influx():
+    """El enrutado directo funciona sobre la forma real de las métricas de InfluxDB"""
+    tranquilo = {"saturacion_global": 0.35, "emergencia_activa": 0, "pacientes_atendidos": 98}
+    metricas = _metricas_influx({h: tranquilo for h in report_routes.HOSPITALES})
+
+    assert metricas["data_source"] == "influxdb" and metricas["hospitals"]
+    assert "triage_distribution" in metricas["estimated_fields"]
+    assert _is_routine(metricas), "Un periodo tranquilo real debe ir directo a la plantilla"
+
+    # Una emergencia activa en un hospital cuenta como incidencia
+    con_emergencia = {h: tranquilo for h in report_routes.HOSPITALES}
+    con_emergencia["chuac"] = dict(tranquilo, emergencia_activa=1)
+    assert not _is_routine(_metricas_influx(con_emergencia))
+
+    # Saturación alta: se mantiene el análisis con LLM
+    saturado = {h: dict(tranquilo, saturacion_global=0.85) for h in report_routes.HOSPITALES}
+    assert not _is_routine(_metricas_influx(saturado))
+
+    print("✓ Test rutina con métricas InfluxDB: OK")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TESTS DEL ENRUTADO DE ANÁLISIS DE INFORMES")
+    print("=" * 60)
+
+    try:
+        test_rutina_con_datos_reportados()
+
+        test_triaje_desconocido_no_bloquea()
+
+        test_rutina_con_metricas_influx()
+
+        print("=" * 60)
+        print("TODOS LOS TESTS PASARON ✓")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"✗ TEST FALLÓ: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"✗ ERROR: {e}")
+        exit(1)